@@ -0,0 +1,40 @@
+# config/_env.py
+import functools
+import io
+import os
+from collections import ChainMap
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping
+
+from dotenv import dotenv_values
+
+from config._paths import BASE_DIR
+
+DOTENV_PATH = BASE_DIR / ".env"
+
+def _parse_dotenv(path: Path) -> Mapping[str, str]:
+    """读取并解析 .env 文件，文件不存在时返回空映射"""
+    try:
+        content = path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return MappingProxyType({})
+    values = dotenv_values(stream=io.StringIO(content))
+    return MappingProxyType({k: v for k, v in values.items() if v is not None})
+
+
+@functools.lru_cache(maxsize=1)
+def load_config(dotenv_path: Path = DOTENV_PATH) -> Mapping[str, str]:
+    """
+    加载框架配置快照 (只读)，结果由 lru_cache 缓存，.env 文件在进程内只解析一次。
+    进程环境变量优先于 .env 文件中的同名配置，与 load_dotenv() 的默认行为一致。
+    """
+    return MappingProxyType(ChainMap(dict(os.environ), _parse_dotenv(dotenv_path)))
+
+
+def env_bool(name: str, default: str = "false") -> bool:
+    """读取布尔类型配置"""
+    return CONFIG.get(name, default).lower() == "true"
+
+
+CONFIG = load_config()
@@ -0,0 +1,20 @@
+# config/_paths.py
+import functools
+import os
+from pathlib import Path
+
+# --- 基础路径配置 ---
+# 使用 abspath + normpath 代替 Path.resolve()，避免导入时的 realpath/stat 系统调用
+BASE_DIR = Path(os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+
+# 浏览器数据存储根目录
+USER_DATA_ROOT = BASE_DIR / "data" / "session_data"
+
+# 指纹持久化文件
+FINGERPRINT_DB_PATH = BASE_DIR / "data" / "fingerprints.jsonl"
+
+
+@functools.lru_cache(maxsize=None)
+def init_script_path(name: str) -> Path:
+    """返回 core/init_scripts 下指定脚本的路径 (按名称缓存)"""
+    return BASE_DIR / "core" / "init_scripts" / name
@@ -1,27 +1,30 @@
 # config/logging_config.py
+import atexit
 import logging
 import logging.handlers
-import os
+import queue
 from pathlib import Path
 
+from config._env import CONFIG, env_bool
+
 def setup_logging():
-    """初始化日志配置"""
-    # 创建日志目录
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
+    """初始化日志配置 (重复调用时直接返回，避免重复添加 handler)"""
+    if getattr(setup_logging, "_done", False) or logging.getLogger().hasHandlers():
+        return
+    setup_logging._done = True
 
     # 基础配置
-    log_level = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper())
+    log_level = getattr(logging, CONFIG.get("LOG_LEVEL", "INFO").upper())
 
-    # 根日志配置
-    logging.basicConfig(
-        level=log_level,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-        handlers=[
-            # 控制台输出
-            logging.StreamHandler(),
-            # 文件输出 - 按日期分割
+    # 控制台输出
+    handlers = [logging.StreamHandler()]
+
+    # 文件输出 - 按日期分割，可通过 ENABLE_FILE_LOG=false 关闭
+    if env_bool("ENABLE_FILE_LOG", "true"):
+        # 创建日志目录
+        log_dir = Path("logs")
+        log_dir.mkdir(exist_ok=True)
+        handlers.append(
             logging.handlers.TimedRotatingFileHandler(
                 log_dir / "cvh_scraper.log",
                 when="midnight",
@@ -29,8 +32,25 @@ def setup_logging():
                 backupCount=30,
                 encoding="utf-8"
             )
-        ]
+        )
+
+    formatter = logging.Formatter(
+        "%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
     )
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # 根日志只挂一个 QueueHandler，调用方只需将日志记录入队；
+    # 格式化和写控制台/文件由 QueueListener 的后台线程完成，进程退出时停止监听并写完剩余日志
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(log_level)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
     # 设置第三方库的日志级别
     logging.getLogger("playwright").setLevel(logging.WARNING)
@@ -38,4 +58,4 @@ def setup_logging():
 
     # 创建特定模块的日志记录器
     logger = logging.getLogger("CVH_SCRAPER")
-    logger.info("Logging system initialized")
\ No newline at end of file
+    logger.info("Logging system initialized")
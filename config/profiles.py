@@ -0,0 +1,80 @@
+# config/profiles.py
+import functools
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal, Optional
+
+from config._env import CONFIG, env_bool
+from config._paths import BASE_DIR, USER_DATA_ROOT, FINGERPRINT_DB_PATH, init_script_path
+from core.browser import BrowserConfig, SessionConfig
+
+Profile = Literal["custom", "builtin", "dev"]
+
+# 自定义浏览器的默认位置
+CUSTOM_BROWSER_EXECUTABLE_PATH = BASE_DIR / "chrome" / "Chrome-bin" / "chrome.exe"
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+
+@dataclass(frozen=True, slots=True)
+class PlaywrightConfig:
+    """Playwright 浏览器和会话的详细配置 (只读，由 make_config 按 profile 生成)"""
+    browser_executable_path: Optional[Path]
+    user_data_root: Path
+    save_fingerprint: bool
+    fingerprint_db_path: Path
+    # 沿用原配置类的属性名，直接保存配置对象，调用方无需再用 **dict 构造
+    BROWSER_CONFIG: BrowserConfig
+    SESSION_CONFIG: SessionConfig
+
+
+@functools.cache
+def make_config(profile: Profile = "builtin") -> PlaywrightConfig:
+    """
+    按 profile 生成配置，相同 profile 返回同一个实例。
+    - custom:  使用本地自定义浏览器 (CUSTOM_BROWSER_EXECUTABLE_PATH)
+    - builtin: 使用 Playwright 自动下载和管理的 Chromium 浏览器
+    - dev:     使用内置浏览器并以有界面模式运行，便于本地调试
+    """
+    if profile not in ("custom", "builtin", "dev"):
+        raise ValueError(f"Unknown config profile: {profile}")
+
+    executable_path = CUSTOM_BROWSER_EXECUTABLE_PATH if profile == "custom" else None
+
+    # 全局浏览器配置
+    # 当使用 executable_path 时，不应指定 channel；内置浏览器同样不需要 channel
+    browser_config = BrowserConfig(
+        headless=False if profile == "dev" else env_bool("BROWSER_HEADLESS", "true"),
+        executable_path=str(executable_path) if executable_path else None,
+        slow_mo=int(CONFIG.get("BROWSER_SLOW_MO", "0")),
+        args=(
+            "--disable-infobars",
+            "--disable-blink-features=AutomationControlled",
+        ),
+    )
+
+    # 通用浏览器会话配置
+    session_config = SessionConfig(
+        user_data_root=USER_DATA_ROOT,
+        init_script_path=init_script_path("stealth.min.js"),
+        user_agent=DEFAULT_USER_AGENT,
+        viewport={"width": 1920, "height": 1080},
+        browser_args=(
+            "--timezone=Asia/Shanghai",
+            "--lang=zh-CN",
+            "--accept-lang=zh-CN",
+            "--fpseed=12lfsfffaughu98",  # 示例指纹种子
+        ),
+    )
+
+    return PlaywrightConfig(
+        browser_executable_path=executable_path,
+        user_data_root=USER_DATA_ROOT,
+        save_fingerprint=env_bool("SAVE_FINGERPRINT"),
+        fingerprint_db_path=FINGERPRINT_DB_PATH,
+        BROWSER_CONFIG=browser_config,
+        SESSION_CONFIG=session_config,
+    )
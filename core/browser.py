@@ -1,12 +1,20 @@
 # core/browser.py
 import asyncio
+import concurrent.futures
+import functools
+import hashlib
 import json
 import logging
+import os
+import string
+import time
 import portalocker
+from collections import ChainMap
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Mapping, Set, Tuple
 
 from playwright.async_api import (
     async_playwright,
@@ -17,53 +25,234 @@ from playwright.async_api import (
     ProxySettings,
 )
 
-from config.default import SAVE_FINGERPRINT, FINGERPRINT_DB_PATH
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时回退到标准库 json
+    orjson = None
 
+from config._env import env_bool
+from config._paths import FINGERPRINT_DB_PATH, init_script_path
 
-@dataclass
+SAVE_FINGERPRINT = env_bool("SAVE_FINGERPRINT")
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+
+@dataclass(frozen=True, slots=True)
 class BrowserConfig:
     """全局浏览器启动配置"""
     headless: bool = True
     executable_path: Optional[str] = None
     channel: Optional[str] = None
     slow_mo: float = 0
-    args: List[str] = field(default_factory=list)
+    args: Tuple[str, ...] = ()
 
+    def __post_init__(self):
+        object.__setattr__(self, "args", tuple(self.args))
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class SessionConfig:
     """浏览器会话配置"""
     user_data_root: Path
-    proxy: Optional[ProxySettings] = None
+    proxy: Optional[ProxySettings] = field(default=None, hash=False)
     user_agent: Optional[str] = None
-    viewport: Dict[str, int] = field(default_factory=lambda: {"width": 1920, "height": 1080})
+    viewport: Dict[str, int] = field(default_factory=lambda: {"width": 1920, "height": 1080}, hash=False)
     init_script_path: Optional[Path] = None
-    browser_args: List[str] = field(default_factory=list)
+    browser_args: Tuple[str, ...] = ()
     fingerprint_profile_path: Optional[Path] = None
+    # 创建 BrowserContext 时的基础参数，构造时计算一次，各会话共享
+    base_launch_kwargs: Mapping[str, Any] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "browser_args", tuple(self.browser_args))
+        object.__setattr__(self, "base_launch_kwargs", MappingProxyType({
+            "viewport": self.viewport,
+            "user_agent": self.user_agent,
+            "proxy": self.proxy,
+        }))
 
     def get_storage_state_path(self, session_name: str) -> Path:
         """根据会话名生成持久化文件路径"""
         return self.user_data_root / f"{session_name}_state.json"
 
 
-async def _save_fingerprint_non_blocking(fingerprint_record: Dict[str, Any]):
-    """在后台线程中异步追加指纹记录，使用文件锁避免并发写入问题"""
-    loop = asyncio.get_running_loop()
+# 指纹采集脚本，路径和是否存在只在导入时计算一次
+_FP_SCRIPT_PATH = init_script_path("get_fingerprint.js")
+_FP_SCRIPT_EXISTS = _FP_SCRIPT_PATH.is_file()
+
+# 已确认存在的目录，避免每次进入会话都重复 mkdir
+_dir_ready: Set[Path] = set()
+
+
+def _ensure_dir(path: Path):
+    """确保目录存在 (包括父目录)，同一目录在进程内只创建一次"""
+    if path not in _dir_ready:
+        path.mkdir(parents=True, exist_ok=True)
+        _dir_ready.add(path)
+
+
+def _path_exists(path: Optional[Path]) -> bool:
+    """通过一次 os.stat 判断路径是否存在"""
+    if path is None:
+        return False
+    try:
+        os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return False
+    return True
+
+
+def _mtime_ns(path: Optional[Path]) -> Optional[int]:
+    """通过一次 os.stat 获取文件修改时间，文件不存在时返回 None"""
+    if path is None:
+        return None
+    try:
+        return os.stat(path).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+@functools.lru_cache(maxsize=32)
+def _load_fp_profile(path_str: str, mtime_ns: int) -> Dict[str, Any]:
+    """
+    加载指纹配置文件，按 (路径, 修改时间) 缓存，文件变化后自动重新加载。
+    返回的字典在会话之间共享，调用方不应修改。
+    """
+    return _json_loads(Path(path_str).read_bytes())
+
+
+# 指纹伪造脚本模板：整个指纹只序列化一次，由页面内循环定义各属性
+_FP_OVERRIDE_TEMPLATE = string.Template(
+    "(() => {\n"
+    "  const fp = $fingerprint;\n"
+    "  for (const key of Object.keys(fp)) {\n"
+    "    Object.defineProperty(navigator, key, { get: () => fp[key] });\n"
+    "  }\n"
+    "})();"
+)
+
+
+@functools.lru_cache(maxsize=32)
+def _fp_override_script(path_str: str, mtime_ns: int) -> str:
+    """根据指纹配置文件生成伪造脚本，与 _load_fp_profile 使用相同的缓存键"""
+    fingerprint = _load_fp_profile(path_str, mtime_ns)["fingerprint"]
+    # 移除 UA，因为它已经通过 launch_kwargs 设置了 (不修改缓存中的原始数据)
+    fp_data = {k: v for k, v in fingerprint.items() if k != "user_agent"}
+    return _FP_OVERRIDE_TEMPLATE.substitute(fingerprint=json.dumps(fp_data))
+
+
+@functools.lru_cache(maxsize=1024)
+def _session_logger(name: str) -> logging.Logger:
+    """按会话名缓存日志记录器，同名会话重复创建时不再访问 logging 模块的全局锁"""
+    return logging.getLogger(f"Session[{name}]")
+
+
+@functools.lru_cache(maxsize=None)
+def _read_script(path: Path) -> str:
+    """读取注入脚本内容，进程内所有会话共享同一份缓存"""
+    return path.read_text(encoding="utf-8")
+
+
+def _dumps_line(record: Dict[str, Any]) -> bytes:
+    """将一条记录序列化为 JSONL 行 (UTF-8 字节)"""
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+# 已采集的指纹，键为 UA 与启动参数的摘要，相同配置的会话无需重复采集
+_fingerprint_cache: Dict[bytes, Dict[str, Any]] = {}
+
+
+def _fingerprint_key(user_agent: Optional[str], browser_args: Tuple[str, ...]) -> bytes:
+    return hashlib.blake2b((user_agent or "").encode() + repr(browser_args).encode()).digest()
+
+
+# 指纹写入专用的单线程执行器，不与默认线程池中的其他阻塞任务排队；
+# 单线程同时保证了进程内的写入顺序，文件锁仅用于跨进程互斥
+_FP_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="fp-writer")
 
-    def locked_write():
+
+class _FingerprintWriter:
+    """
+    指纹记录后台写入器。
+    所有会话共享一个队列和一个后台任务，按批次追加写入，使用文件锁避免跨进程并发写入问题。
+    """
+    def __init__(self, path: Path, max_batch: int = 64):
+        self.path = path
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(
+        self,
+        session_name: str,
+        storage_path: Path,
+        user_agent: Optional[str],
+        browser_args: Tuple[str, ...],
+        fingerprint: Dict[str, Any],
+    ):
+        """
+        提交一条指纹记录，立即返回。
+        只记录时间戳和原始字段，记录的组装和序列化都在后台线程中完成，不占用事件循环。
+        """
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        self._queue.put_nowait((time.time(), session_name, storage_path, user_agent, browser_args, fingerprint))
+
+    async def _run(self):
+        """后台任务：取出队列中已有的记录，每批只打开一次文件"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await loop.run_in_executor(_FP_EXECUTOR, self._write_batch, batch)
+            except Exception as e:
+                logging.error(f"Failed to execute non-blocking save: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _build_record(entry: Tuple) -> Dict[str, Any]:
+        timestamp, session_name, storage_path, user_agent, browser_args, fingerprint = entry
+        return {
+            "timestamp_utc": datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None).isoformat(),
+            "session_name": session_name,
+            "storage_state_path": str(storage_path),
+            "config": {
+                "user_agent": user_agent,
+                "browser_args": browser_args,
+            },
+            "fingerprint": fingerprint,
+        }
+
+    def _write_batch(self, batch: List[Tuple]):
         try:
-            with portalocker.Lock(FINGERPRINT_DB_PATH, "a", encoding="utf-8", timeout=5) as f:
-                f.write(json.dumps(fingerprint_record, ensure_ascii=False) + "\n")
-            logging.info(f"Fingerprint for session '{fingerprint_record.get('session_name')}' saved in background.")
+            data = b"".join(_dumps_line(self._build_record(entry)) for entry in batch)
+            with portalocker.Lock(self.path, "ab", timeout=5) as f:
+                f.write(data)
+            logging.info(f"{len(batch)} fingerprint record(s) saved in background.")
         except portalocker.LockException as e:
             logging.error(f"Could not acquire lock for fingerprint db: {e}")
         except Exception as e:
             logging.error(f"Background fingerprint save failed: {e}")
 
-    try:
-        await loop.run_in_executor(None, locked_write)
-    except Exception as e:
-        logging.error(f"Failed to execute non-blocking save: {e}")
+    async def flush(self):
+        """等待已提交的记录全部写入，然后停止后台任务"""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.join()
+            self._task.cancel()
+        self._task = None
+
+
+_fingerprint_writer = _FingerprintWriter(FINGERPRINT_DB_PATH)
 
 
 class BrowserSession:
@@ -83,30 +272,37 @@ class BrowserSession:
         self.config = config
         self.context: Optional[BrowserContext] = None
         self.storage_path = self.config.get_storage_state_path(self.session_name)
-        self.logger = logging.getLogger(f"Session[{self.session_name}]")
+        self.logger = _session_logger(self.session_name)
         self.fingerprint_data: Optional[Dict[str, Any]] = None
+        self._fingerprint_key: Optional[bytes] = None
+        self._collect_fingerprint = False
 
-        if clear_state and self.storage_path.exists():
-            self.storage_path.unlink()
-            self.logger.info("Cleared persistent state file: %s", self.storage_path)
+        if clear_state:
+            try:
+                self.storage_path.unlink()
+                self.logger.info("Cleared persistent state file: %s", self.storage_path)
+            except FileNotFoundError:
+                pass
 
     async def __aenter__(self) -> "BrowserSession":
         """进入上下文，创建并初始化 BrowserContext，并采集或应用指纹"""
         self.logger.info("Initializing browser context...")
+        _ensure_dir(self.storage_path.parent)
 
-        launch_kwargs: Dict[str, Any] = {
-            "viewport": self.config.viewport,
-            "user_agent": self.config.user_agent,
-            "proxy": self.config.proxy,
-        }
+        # 只记录需要覆盖的参数，基础参数直接复用配置中预先计算好的映射
+        launch_kwargs: Dict[str, Any] = {}
+
+        # 每个路径只 stat 一次，结果在本次初始化中复用
+        fp_profile_mtime = _mtime_ns(self.config.fingerprint_profile_path)
+        has_storage = _path_exists(self.storage_path)
+        has_init_script = _path_exists(self.config.init_script_path)
 
         # --- 指纹应用 ---
         fingerprint_to_apply = None
-        if self.config.fingerprint_profile_path and self.config.fingerprint_profile_path.exists():
+        if fp_profile_mtime is not None:
             try:
-                with self.config.fingerprint_profile_path.open("r", encoding="utf-8") as f:
-                    fingerprint_to_apply = json.load(f)
-                
+                fingerprint_to_apply = _load_fp_profile(str(self.config.fingerprint_profile_path), fp_profile_mtime)
+
                 # 优先使用指纹文件中的 UA
                 if "user_agent" in fingerprint_to_apply.get("fingerprint", {}):
                     launch_kwargs["user_agent"] = fingerprint_to_apply["fingerprint"]["user_agent"]
@@ -116,61 +312,64 @@ class BrowserSession:
                 self.logger.error(f"Failed to load fingerprint profile: {e}")
                 fingerprint_to_apply = None
 
-        if self.storage_path.exists():
+        if has_storage:
             launch_kwargs["storage_state"] = self.storage_path
             self.logger.info("-> Loading state from: %s", self.storage_path)
 
-        self.context = await self.browser.new_context(**launch_kwargs)
+        self.context = await self.browser.new_context(
+            **ChainMap(launch_kwargs, self.config.base_launch_kwargs)
+        )
 
         # --- 注入初始化脚本 ---
-        # 1. 注入 stealth.min.js (如果配置了)
-        if self.config.init_script_path and self.config.init_script_path.exists():
-            await self.context.add_init_script(path=self.config.init_script_path)
-            self.logger.info("-> Injected stealth script from: %s", self.config.init_script_path)
+        # 所有脚本拼接后只调用一次 add_init_script，减少一次 CDP 往返
+        init_scripts: List[str] = []
+
+        # 1. stealth.min.js (如果配置了)
+        if has_init_script:
+            init_scripts.append(_read_script(self.config.init_script_path))
+            self.logger.info("-> Injecting stealth script from: %s", self.config.init_script_path)
 
-        # 2. 如果有指纹配置，生成并注入伪造脚本
+        # 2. 如果有指纹配置，生成伪造脚本
         if fingerprint_to_apply:
             try:
-                fp_data = fingerprint_to_apply["fingerprint"]
-                # 移除 UA，因为它已经通过 launch_kwargs 设置了
-                fp_data.pop("user_agent", None)
-                
-                # 生成伪造脚本
-                override_script = "(() => {\n"
-                for key, value in fp_data.items():
-                    # 简单的 JS 类型转换
-                    js_value = json.dumps(value)
-                    override_script += f"  Object.defineProperty(navigator, '{key}', {{ get: () => {js_value} }});\n"
-                override_script += "})();"
-                
-                await self.context.add_init_script(script=override_script)
-                self.logger.info("-> Injected fingerprint override script.")
+                override_script = _fp_override_script(str(self.config.fingerprint_profile_path), fp_profile_mtime)
+                init_scripts.append(override_script)
+                self.logger.info("-> Injecting fingerprint override script.")
             except Exception as e:
-                self.logger.error(f"Failed to generate or inject fingerprint script: {e}")
+                self.logger.error(f"Failed to generate fingerprint script: {e}")
+
+        if init_scripts:
+            await self.context.add_init_script(script="\n;\n".join(init_scripts))
 
         # --- 指纹采集 (仅在未应用指纹时进行) ---
         if not fingerprint_to_apply and SAVE_FINGERPRINT:
-            fp_page = await self.context.new_page()
-            try:
-                fp_script_path = Path(__file__).parent / "init_scripts" / "get_fingerprint.js"
-                if fp_script_path.exists():
-                    fp_script = fp_script_path.read_text(encoding="utf-8")
-                    await fp_page.goto("about:blank")
-                    fingerprint_json = await fp_page.evaluate(f"({fp_script})()")
-                    self.fingerprint_data = json.loads(fingerprint_json)
-                    self.logger.info("Browser fingerprint collected.")
-                else:
-                    self.logger.warning("Fingerprint script not found at: %s", fp_script_path)
-            except Exception as e:
-                self.logger.error(f"Failed to collect fingerprint: {e}")
-            finally:
-                await fp_page.close()
+            self._fingerprint_key = _fingerprint_key(self.config.user_agent, self.config.browser_args)
+            cached = _fingerprint_cache.get(self._fingerprint_key)
+            if cached is not None:
+                self.fingerprint_data = cached
+                self.logger.info("Browser fingerprint reused from cache.")
+            else:
+                # 推迟到调用方第一次 new_page() 时在该页面上采集，省去一个临时页面；
+                # 会话只用 context.request 而从未创建页面时，在退出前用临时页面采集
+                self._collect_fingerprint = True
 
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """退出上下文，保存状态并关闭 BrowserContext"""
         if self.context:
+            # 0. 整个会话从未创建页面时补采指纹；会话因异常退出时跳过，采集失败也不影响后续的保存和关闭
+            if self._collect_fingerprint and exc_type is None:
+                self._collect_fingerprint = False
+                try:
+                    fp_page = await self.context.new_page()
+                    try:
+                        await self._collect_fingerprint_on(fp_page)
+                    finally:
+                        await fp_page.close()
+                except Exception as e:
+                    self.logger.error(f"Failed to collect fingerprint: {e}")
+
             # 1. 保存会话状态 (Cookies, LocalStorage)
             try:
                 await self.context.storage_state(path=self.storage_path)
@@ -180,17 +379,13 @@ class BrowserSession:
 
             # 2. 异步保存指纹/UA信息
             if self.fingerprint_data:
-                fingerprint_record = {
-                    "timestamp_utc": datetime.utcnow().isoformat(),
-                    "session_name": self.session_name,
-                    "storage_state_path": str(self.storage_path),
-                    "config": {
-                        "user_agent": self.config.user_agent,
-                        "browser_args": self.config.browser_args,
-                    },
-                    "fingerprint": self.fingerprint_data,
-                }
-                asyncio.create_task(_save_fingerprint_non_blocking(fingerprint_record))
+                _fingerprint_writer.submit(
+                    self.session_name,
+                    self.storage_path,
+                    self.config.user_agent,
+                    self.config.browser_args,
+                    self.fingerprint_data,
+                )
 
             await self.context.close()
             self.logger.info("Browser context closed.")
@@ -201,8 +396,28 @@ class BrowserSession:
         if not self.context:
             raise RuntimeError("Context is not initialized. Use 'async with BrowserSession(...)'.")
         page = await self.context.new_page()
+        if self._collect_fingerprint:
+            self._collect_fingerprint = False
+            await self._collect_fingerprint_on(page)
         return page
 
+    async def _collect_fingerprint_on(self, page: Page):
+        """在新建的页面上执行采集脚本，并按 UA/启动参数缓存结果"""
+        try:
+            if _FP_SCRIPT_EXISTS:
+                fp_script = _read_script(_FP_SCRIPT_PATH)
+                # 新页面的初始文档不保证已执行上下文的 init script (如 stealth.min.js)，
+                # 先导航到 about:blank 使其生效，再采集与真实页面一致的指纹
+                await page.goto("about:blank")
+                fingerprint_json = await page.evaluate(f"({fp_script})()")
+                self.fingerprint_data = _json_loads(fingerprint_json)
+                _fingerprint_cache[self._fingerprint_key] = self.fingerprint_data
+                self.logger.info("Browser fingerprint collected.")
+            else:
+                self.logger.warning("Fingerprint script not found at: %s", _FP_SCRIPT_PATH)
+        except Exception as e:
+            self.logger.error(f"Failed to collect fingerprint: {e}")
+
 
 class PlaywrightBrowser:
     """
@@ -214,23 +429,25 @@ class PlaywrightBrowser:
         self.pw: Optional[Playwright] = None
         self.browser: Optional[Browser] = None
         self.logger = logging.getLogger("PlaywrightBrowser")
+        # 启动参数中不随启动变化的部分，只计算一次，重复启动时复用
+        self._base_launch_options: Mapping[str, Any] = MappingProxyType({
+            "headless": self.config.headless,
+            "slow_mo": self.config.slow_mo,
+            "args": list(self.config.args),
+        })
 
     async def __aenter__(self) -> "PlaywrightBrowser":
         """启动 Playwright 并启动浏览器"""
         self.logger.info("Starting Playwright...")
         self.pw = await async_playwright().start()
         
-        launch_options: Dict[str, Any] = {
-            "headless": self.config.headless,
-            "slow_mo": self.config.slow_mo,
-            "args": self.config.args,
-        }
-
         # 动态添加 executable_path 或 channel，确保互斥
+        overrides: Dict[str, Any] = {}
         if self.config.executable_path:
-            launch_options["executable_path"] = str(self.config.executable_path)
+            overrides["executable_path"] = str(self.config.executable_path)
         elif self.config.channel:
-            launch_options["channel"] = self.config.channel
+            overrides["channel"] = self.config.channel
+        launch_options = ChainMap(overrides, self._base_launch_options)
         
         self.browser = await self.pw.chromium.launch(**launch_options)
         self.logger.info("Browser launched.")
@@ -238,6 +455,7 @@ class PlaywrightBrowser:
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """关闭浏览器和 Playwright"""
+        await _fingerprint_writer.flush()
         if self.browser:
             await self.browser.close()
             self.logger.info("Browser closed.")
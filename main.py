@@ -6,6 +6,7 @@ import os
 import signal
 import time
 from contextlib import asynccontextmanager
+from typing import Set
 
 # --- 配置导入 ---
 from config.playwright_builtin import (
@@ -16,11 +17,12 @@ from config.playwright_builtin import (
 from config.logging_config import setup_logging
 
 # --- 核心组件和脚本导入 ---
-from core.browser import PlaywrightBrowser
+from core.browser import PlaywrightBrowser, SessionConfig
 from scripts.cvh_scraper import scrape_list_pages, scrape_detail_page
 
 # --- 辅助工具导入 ---
 from utils.startup import (
+    install_fast_event_loop,
     load_configs,
     validate_browser_path,
     check_and_install_browser,
@@ -34,7 +36,9 @@ RECORDS_PER_PAGE = 30
 LIST_CONSUMERS = 2
 DETAIL_CONSUMERS = 4
 PAGES_PER_LIST_TASK = 10
-DETAIL_QUEUE_SIZE = 1000
+DETAIL_QUEUE_SIZE = 1000  # 详情页队列中最多积压的 detail_id 数量
+DETAIL_PAGES_PER_WORKER = 4  # 每个详情页消费者在自己的会话中并发采集的槽位数 (需要渲染时每个槽位一个页面)
+DETAIL_BATCH_SIZE = 5  # 详情页消费者每次最多从队列取出的任务数 (每个任务是一页的 detail_id)
 
 # 示例项目数据库配置
 EXAMPLE_DATABASE_CONFIG = {
@@ -43,11 +47,20 @@ EXAMPLE_DATABASE_CONFIG = {
     "user": "root",
     "password": "password",
     "db": "db_name",
+    # 每个消费者同时最多占用一个连接，另留余量给并发的查重查询和批量写入
+    "minsize": LIST_CONSUMERS + DETAIL_CONSUMERS,
+    "maxsize": LIST_CONSUMERS + DETAIL_CONSUMERS + 4,
+    # 详情数据累计到该条数或每隔该秒数批量写入一次
+    "detail_flush_size": 200,
+    "detail_flush_interval": 2.0,
 }
 
 # 性能监控
 class PerformanceMonitor:
-    """性能监控类"""
+    """
+    性能监控类。
+    消费者的热路径中直接对计数属性做 +=，省去方法调用；派生指标只在 get_stats 中计算。
+    """
     def __init__(self):
         self.start_time = time.time()
         self.list_pages_processed = 0
@@ -138,14 +151,39 @@ app_state = ApplicationState()
 
 # 优雅关闭处理
 def signal_handler(signum, frame):
-    """处理系统信号"""
+    """处理系统信号：第一次收到时开始优雅关闭，并恢复默认处理，再次收到 (如第二次 Ctrl+C) 时直接终止"""
     logging.info(f"Received signal {signum}, initiating graceful shutdown...")
     app_state.is_shutting_down = True
+    signal.signal(signum, signal.default_int_handler if signum == signal.SIGINT else signal.SIG_DFL)
 
 # 注册信号处理器
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
+
+async def get_or_finished(queue: asyncio.Queue, finished: asyncio.Event):
+    """
+    从队列取出一个任务；生产方已设置 finished 且队列已取空时返回 None。
+    生产方无需知道消费者数量，也不会因某个消费者提前退出而使其他消费者一直等待结束信号。
+    """
+    while True:
+        # 快速路径：队列中已有任务时直接取出，无需创建等待任务
+        if not queue.empty():
+            return queue.get_nowait()
+        if finished.is_set():
+            return None
+
+        get_task = asyncio.create_task(queue.get())
+        finished_task = asyncio.create_task(finished.wait())
+        try:
+            await asyncio.wait({get_task, finished_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            finished_task.cancel()
+            if not get_task.done():
+                get_task.cancel()
+        if get_task.done() and not get_task.cancelled():
+            return get_task.result()
+
 @asynccontextmanager
 async def managed_resources():
     """资源管理上下文管理器"""
@@ -159,8 +197,10 @@ async def managed_resources():
         resources['session_config'] = session_config
 
         # 初始化队列
-        list_queue = asyncio.Queue()
-        detail_queue = asyncio.Queue(maxsize=DETAIL_QUEUE_SIZE)
+        # 列表页队列有界，生产者在消费者跟不上时阻塞在 put 上，避免一次性生成全部任务
+        list_queue = asyncio.Queue(maxsize=LIST_CONSUMERS * 2)
+        # 详情页队列中的每个任务是一整页的 detail_id 列表
+        detail_queue = asyncio.Queue(maxsize=max(1, DETAIL_QUEUE_SIZE // RECORDS_PER_PAGE))
         resources['list_queue'] = list_queue
         resources['detail_queue'] = detail_queue
 
@@ -182,8 +222,8 @@ async def managed_resources():
                 logging.error(f"Error cleaning up resource {name}: {e}")
 
 
-async def list_producer(queue: asyncio.Queue):
-    """生产者：生成列表页采集任务"""
+async def list_producer(queue: asyncio.Queue, finished: asyncio.Event):
+    """生产者：生成列表页采集任务，结束 (包括出错) 时设置 finished"""
     logging.info("LIST_PRODUCER: Started.")
     total_pages = (TOTAL_RECORDS + RECORDS_PER_PAGE - 1) // RECORDS_PER_PAGE
     tasks_generated = 0
@@ -200,31 +240,26 @@ async def list_producer(queue: asyncio.Queue):
             tasks_generated += 1
 
             if tasks_generated % 100 == 0:
-                logging.info(f"LIST_PRODUCER: Generated {tasks_generated} tasks, queue size: {queue.qsize()}")
-
-        # 发送结束信号
-        for _ in range(LIST_CONSUMERS):
-            await queue.put(None)
+                logging.info("LIST_PRODUCER: Generated %s tasks, queue size: %s", tasks_generated, queue.qsize())
 
         logging.info(f"LIST_PRODUCER: Finished. Generated {tasks_generated} tasks.")
     except Exception as e:
         logging.error(f"LIST_PRODUCER: Error during production: {e}")
-        # 确保发送结束信号
-        for _ in range(LIST_CONSUMERS):
-            try:
-                await queue.put(None)
-            except Exception:
-                pass
         raise
+    finally:
+        # 通知消费者不会再有新任务
+        finished.set()
 
 
 async def list_consumer(
     worker_id: int,
     list_queue: asyncio.Queue,
+    list_finished: asyncio.Event,
     detail_queue: asyncio.Queue,
     browser_manager: PlaywrightBrowser,
     session_config: SessionConfig,
     db_manager: DatabaseManager,
+    seen_detail_ids: Set[str],
 ):
     """消费者：处理列表页任务，并将detail_id送入详情页队列"""
     logging.info(f"LIST_CONSUMER_{worker_id}: Started.")
@@ -232,45 +267,48 @@ async def list_consumer(
     tasks_processed = 0
 
     try:
-        while not app_state.is_shutting_down:
-            try:
-                task_info = await list_queue.get()
+        # 每个列表页工作者在整个生命周期内只创建一个会话和一个数据库连接，所有列表任务复用
+        session_manager = browser_manager.create_session(session_name, session_config)
+        async with session_manager as session, db_manager.connection() as db_conn:
+            while not app_state.is_shutting_down:
+                task_info = await get_or_finished(list_queue, list_finished)
                 if task_info is None:
                     logging.info(f"LIST_CONSUMER_{worker_id}: Received end signal.")
                     break
 
-                if app_state.is_shutting_down:
-                    logging.info(f"LIST_CONSUMER_{worker_id}: Shutdown requested, stopping processing.")
-                    list_queue.task_done()
-                    break
-
-                app_state.tasks_running += 1
-                await scrape_list_pages(
-                    browser_manager,
-                    session_config,
-                    session_name=session_name,
-                    db_manager=db_manager,
-                    detail_task_queue=detail_queue,
-                    max_pages=task_info["pages"],
-                    offset=task_info["offset"],
-                )
-                tasks_processed += 1
-                app_state.tasks_running -= 1
-                performance_monitor.increment_list_pages()
-
-                if tasks_processed % 50 == 0:
-                    logging.info(f"LIST_CONSUMER_{worker_id}: Processed {tasks_processed} tasks.")
-
-            except Exception as e:
-                app_state.tasks_running -= 1
-                performance_monitor.increment_errors()
-                logging.error(f"LIST_CONSUMER_{worker_id}: Error processing task: {e}")
-                # 继续处理下一个任务
-            finally:
                 try:
-                    list_queue.task_done()
-                except Exception:
-                    pass
+                    if app_state.is_shutting_down:
+                        logging.info(f"LIST_CONSUMER_{worker_id}: Shutdown requested, stopping processing.")
+                        break
+
+                    app_state.tasks_running += 1
+                    await scrape_list_pages(
+                        session,
+                        session_name=session_name,
+                        db_manager=db_manager,
+                        detail_task_queue=detail_queue,
+                        max_pages=task_info["pages"],
+                        offset=task_info["offset"],
+                        seen_detail_ids=seen_detail_ids,
+                        db_conn=db_conn,
+                    )
+                    tasks_processed += 1
+                    app_state.tasks_running -= 1
+                    performance_monitor.list_pages_processed += 1
+
+                    if tasks_processed % 50 == 0:
+                        logging.info("LIST_CONSUMER_%s: Processed %s tasks.", worker_id, tasks_processed)
+
+                except Exception as e:
+                    app_state.tasks_running -= 1
+                    performance_monitor.errors_count += 1
+                    logging.error(f"LIST_CONSUMER_{worker_id}: Error processing task: {e}")
+                    # 继续处理下一个任务
+                finally:
+                    try:
+                        list_queue.task_done()
+                    except Exception:
+                        pass
 
     except Exception as e:
         logging.error(f"LIST_CONSUMER_{worker_id}: Fatal error: {e}")
@@ -281,6 +319,7 @@ async def list_consumer(
 async def detail_consumer(
     worker_id: int,
     detail_queue: asyncio.Queue,
+    detail_finished: asyncio.Event,
     browser_manager: PlaywrightBrowser,
     session_config: SessionConfig,
     db_manager: DatabaseManager,
@@ -290,44 +329,72 @@ async def detail_consumer(
     session_name = f"detail_worker_{worker_id}"
     tasks_processed = 0
 
-    try:
-        while not app_state.is_shutting_down:
+    async def drain_ids(session, pages, slot, pending_ids):
+        """在 pages[slot] 上依次采集 pending_ids 中的 detail_id，多个槽位共享同一个迭代器"""
+        nonlocal tasks_processed
+        for detail_id in pending_ids:
             try:
-                detail_id = await detail_queue.get()
-                if detail_id is None:
-                    logging.info(f"DETAIL_CONSUMER_{worker_id}: Received end signal.")
-                    break
-
-                if app_state.is_shutting_down:
-                    logging.info(f"DETAIL_CONSUMER_{worker_id}: Shutdown requested, stopping processing.")
-                    detail_queue.task_done()
-                    break
-
-                app_state.tasks_running += 1
-                await scrape_detail_page(
-                    browser_manager,
-                    session_config,
+                detail_info = await scrape_detail_page(
+                    session,
+                    pages,
+                    slot,
                     session_name=session_name,
-                    db_manager=db_manager,
                     detail_id=detail_id,
                 )
-                tasks_processed += 1
-                app_state.tasks_running -= 1
-                performance_monitor.increment_detail_pages()
-
-                if tasks_processed % 100 == 0:
-                    logging.info(f"DETAIL_CONSUMER_{worker_id}: Processed {tasks_processed} tasks.")
-
             except Exception as e:
-                app_state.tasks_running -= 1
-                performance_monitor.increment_errors()
+                performance_monitor.errors_count += 1
                 logging.error(f"DETAIL_CONSUMER_{worker_id}: Error processing detail_id {detail_id}: {e}")
                 # 继续处理下一个任务
+                continue
+
+            # 由 DatabaseManager 的写缓冲批量入库
+            await db_manager.enqueue_detail(detail_info)
+            tasks_processed += 1
+            performance_monitor.detail_pages_processed += 1
+
+            if tasks_processed % 100 == 0:
+                logging.info("DETAIL_CONSUMER_%s: Processed %s tasks.", worker_id, tasks_processed)
+
+    try:
+        # 每个工作者只创建一次无状态会话，详情请求复用该会话；
+        # 页面仅在需要浏览器渲染时按槽位创建，详情在这些槽位上并发采集
+        session_manager = browser_manager.create_session(session_name, session_config, clear_state=True)
+        async with session_manager as session:
+            pages = [None] * DETAIL_PAGES_PER_WORKER
+            try:
+                while not app_state.is_shutting_down:
+                    detail_ids = await get_or_finished(detail_queue, detail_finished)
+                    if detail_ids is None:
+                        logging.info(f"DETAIL_CONSUMER_{worker_id}: Received end signal.")
+                        break
+
+                    batch = [detail_ids]
+                    # 一并取出队列中已就绪的任务
+                    while len(batch) < DETAIL_BATCH_SIZE and not detail_queue.empty():
+                        batch.append(detail_queue.get_nowait())
+
+                    try:
+                        if app_state.is_shutting_down:
+                            logging.info(f"DETAIL_CONSUMER_{worker_id}: Shutdown requested, stopping processing.")
+                            break
+
+                        app_state.tasks_running += 1
+                        try:
+                            # 清除上一批留下的 Cookies；批内各页面并发，不再逐个 ID 清除
+                            await session.context.clear_cookies()
+                            pending_ids = iter([detail_id for detail_ids in batch for detail_id in detail_ids])
+                            await asyncio.gather(*(drain_ids(session, pages, slot, pending_ids) for slot in range(len(pages))))
+                        finally:
+                            app_state.tasks_running -= 1
+
+                    except Exception as e:
+                        performance_monitor.errors_count += 1
+                        logging.error(f"DETAIL_CONSUMER_{worker_id}: Error processing batch: {e}")
+                    finally:
+                        for _ in batch:
+                            detail_queue.task_done()
             finally:
-                try:
-                    detail_queue.task_done()
-                except Exception:
-                    pass
+                await asyncio.gather(*(page.close() for page in pages if page is not None))
 
     except Exception as e:
         logging.error(f"DETAIL_CONSUMER_{worker_id}: Fatal error: {e}")
@@ -350,31 +417,22 @@ async def main():
         # 使用示例项目的数据库配置
         db_manager = DatabaseManager(EXAMPLE_DATABASE_CONFIG)
         await db_manager.initialize()
+        # 退出时由资源管理器关闭，写入缓冲中剩余的详情数据
+        resources['db_manager'] = db_manager
 
         browser_config = resources['browser_config']
         session_config = resources['session_config']
         list_queue = resources['list_queue']
         detail_queue = resources['detail_queue']
+        # 生产方结束时设置，替代向每个消费者发送 None 结束信号
+        list_finished = asyncio.Event()
+        detail_finished = asyncio.Event()
+        # 所有列表消费者共享的已入队 detail_id 集合，用于去重；预先载入已采集的 ID，续跑时直接跳过
+        seen_detail_ids: Set[str] = await db_manager.load_seen_detail_ids()
 
-                # 启动浏览器上下文
+        # 启动浏览器上下文
         async with PlaywrightBrowser(browser_config) as browser_manager:
             try:
-                # 1. 启动列表页生产者和消费者
-                list_producer_task = asyncio.create_task(list_producer(list_queue))
-                list_consumer_tasks = [
-                asyncio.create_task(
-                        list_consumer(i + 1, list_queue, detail_queue, browser_manager, session_config, db_manager)
-                    ) for i in range(concurrency_controller.list_consumers)
-            ]
-
-                # 2. 启动详情页消费者
-                detail_consumer_tasks = [
-                    asyncio.create_task(
-                        detail_consumer(i + 1, detail_queue, browser_manager, session_config, db_manager)
-                    ) for i in range(concurrency_controller.detail_consumers)
-                ]
-
-                # 3. 启动并发控制监控任务
                 async def monitor_and_adjust():
                     """定期监控性能并调整并发数"""
                     while not app_state.is_shutting_down:
@@ -386,31 +444,59 @@ async def main():
                                 new_detail_consumers != concurrency_controller.detail_consumers):
                                 logging.info(f"Concurrency adjusted to: {new_list_consumers} list, {new_detail_consumers} detail")
 
-                monitor_task = asyncio.create_task(monitor_and_adjust())
-
-                # 3. 等待列表页任务完成
-                await list_producer_task
-                await list_queue.join()
-                await asyncio.gather(*list_consumer_tasks)
-
-                # 4. 列表页任务完成后，向详情页队列发送结束信号
-                for _ in range(concurrency_controller.detail_consumers):
-                    await detail_queue.put(None)
-
-                # 5. 等待详情页任务完成
-                await detail_queue.join()
-                await asyncio.gather(*detail_consumer_tasks)
-
-                logging.info("All tasks completed successfully.")
-                performance_monitor.log_stats()
-
-            except KeyboardInterrupt:
-                logging.info("Keyboard interrupt received, initiating graceful shutdown...")
-                app_state.is_shutting_down = True
-                # 等待正在运行的任务完成
-                await asyncio.sleep(5)
-                performance_monitor.log_stats()
-                logging.info("Shutdown complete.")
+                # 任一任务异常时 TaskGroup 会取消其余任务并抛出 ExceptionGroup
+                async with asyncio.TaskGroup() as tg:
+                    # 1. 启动列表页生产者和消费者，生产者结束时设置 list_finished
+                    producer_task = tg.create_task(list_producer(list_queue, list_finished))
+                    list_consumer_tasks = [
+                        tg.create_task(
+                            list_consumer(i + 1, list_queue, list_finished, detail_queue, browser_manager, session_config, db_manager, seen_detail_ids)
+                        ) for i in range(concurrency_controller.list_consumers)
+                    ]
+
+                    # 2. 启动详情页消费者
+                    detail_consumer_tasks = [
+                        tg.create_task(
+                            detail_consumer(i + 1, detail_queue, detail_finished, browser_manager, session_config, db_manager)
+                        ) for i in range(concurrency_controller.detail_consumers)
+                    ]
+
+                    # 3. 启动并发控制监控任务
+                    monitor_task = tg.create_task(monitor_and_adjust())
+
+                    async def stop_list_consumers_without_detail():
+                        """
+                        详情页消费者全部退出 (关闭请求或致命错误) 后不会再有人取空详情页队列，
+                        仍在运行的列表页消费者会一直阻塞在有界队列的 put() 上，需要取消。
+                        正常结束时详情页消费者晚于列表页消费者退出，取消已完成的任务不产生影响。
+                        """
+                        await asyncio.wait(detail_consumer_tasks)
+                        for task in list_consumer_tasks:
+                            task.cancel()
+
+                    tg.create_task(stop_list_consumers_without_detail())
+
+                    # 4. 列表页消费者全部退出后，通知详情页消费者不会再有新任务；
+                    #    消费者可能因关闭请求或会话/数据库连接失败而提前退出，队列不会再被取空，
+                    #    此时生产者会一直阻塞在有界队列的 put() 上，需要取消
+                    await asyncio.wait(list_consumer_tasks)
+                    producer_task.cancel()
+                    detail_finished.set()
+
+                    # 5. 详情页消费者处理完队列中剩余任务后退出，随后停止监控任务
+                    await asyncio.wait(detail_consumer_tasks)
+                    monitor_task.cancel()
+
+                # SIGINT/SIGTERM 由 signal_handler 处理：设置 is_shutting_down 后各消费者完成当前任务退出，
+                # TaskGroup 随之正常结束，因此这里不会收到 KeyboardInterrupt
+                if app_state.is_shutting_down:
+                    logging.info("Shutdown complete.")
+                    performance_monitor.log_stats()
+                else:
+                    logging.info("All tasks completed successfully.")
+                    performance_monitor.log_stats()
+                    # 详情表已不设外键，正常结束时清理一次孤儿详情
+                    await db_manager.purge_orphan_details()
 
             except Exception as e:
                 logging.error(f"Fatal error in main execution: {e}")
@@ -422,4 +508,5 @@ async def main():
 
 
 if __name__ == "__main__":
+    install_fast_event_loop()
     asyncio.run(main())
\ No newline at end of file
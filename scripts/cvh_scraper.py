@@ -3,17 +3,26 @@ import asyncio
 import logging
 import time
 import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
 from functools import wraps
+from html.parser import HTMLParser
 
-from playwright.async_api import Page
+import aiomysql
+from playwright.async_api import BrowserContext, Error as PlaywrightError, Page, Route
 
-from core.browser import PlaywrightBrowser, SessionConfig
+from core.browser import BrowserSession
 from utils.database import DatabaseManager
 
 
-def retry_on_failure(max_retries=3, delay=2, backoff=2):
-    """重试装饰器：网络请求失败时自动重试"""
+# 默认只对网络、页面和数据库连接类的异常重试，编程错误直接抛出
+RETRY_EXCEPTIONS = (PlaywrightError, TimeoutError, ConnectionError, aiomysql.OperationalError)
+
+
+def retry_on_failure(max_retries=3, delay=2, backoff=2, cap=60, retry_exceptions=RETRY_EXCEPTIONS):
+    """
+    重试装饰器：网络请求失败时自动重试。
+    等待时间采用 full jitter：在 [0, min(cap, delay * backoff ** attempt)] 内随机，避免并发工作者同步重试。
+    """
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
@@ -21,10 +30,10 @@ def retry_on_failure(max_retries=3, delay=2, backoff=2):
             for attempt in range(max_retries + 1):
                 try:
                     return await func(*args, **kwargs)
-                except Exception as e:
+                except retry_exceptions as e:
                     last_exception = e
                     if attempt < max_retries:
-                        wait_time = delay * (backoff ** attempt) + random.uniform(0, 1)
+                        wait_time = random.uniform(0, min(cap, delay * (backoff ** attempt)))
                         logging.warning(f"{func.__name__} failed (attempt {attempt + 1}/{max_retries + 1}): {e}")
                         logging.info(f"Retrying in {wait_time:.2f} seconds...")
                         await asyncio.sleep(wait_time)
@@ -35,164 +44,503 @@ def retry_on_failure(max_retries=3, delay=2, backoff=2):
     return decorator
 
 
+# 详情页字段名与页面元素 id 的对应关系
+_DETAIL_TEXT_FIELDS = {
+    "sci_name": "formattedName",
+    "chinese_name": "chineseName",
+    "identified_by": "identifiedBy",
+    "date_identified": "dateIdentified",
+    "recorded_by": "recordedBy",
+    "record_number": "recordNumber",
+    "verbatim_event_date": "verbatimEventDate",
+    "locality": "locality",
+    "elevation": "elevation",
+    "habitat": "habitat",
+    "occurrence_remarks": "occurrenceRemarks",
+    "reproductive_condition": "reproductiveCondition",
+}
+
+_DETAIL_EXTRACT_JS = (
+    "() => {\n"
+    "  const text = id => (document.getElementById(id)?.innerText || '').trim();\n"
+    "  return {\n"
+    "    detail_image_url: document.getElementById('spm_image')?.getAttribute('src') || '',\n"
+    + "".join(f"    {field}: text('{element_id}'),\n" for field, element_id in _DETAIL_TEXT_FIELDS.items())
+    + "  };\n"
+    "}"
+)
+
+
+# 详情页动态内容加载完成的判断条件
+_DETAIL_READY_JS = "() => (document.getElementById('formattedName')?.innerText || '').trim().length > 0"
+
+
+# 解析只依赖 DOM 文本和 src 属性，这些资源无需下载
+_BLOCKED_RESOURCE_TYPES = frozenset({"image", "stylesheet", "font", "media"})
+
+
+async def _abort_static_resources(route: Route):
+    if route.request.resource_type in _BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def block_static_resources(page: Page):
+    """拦截页面的图片、样式表、字体和媒体请求，需在 goto 之前调用"""
+    await page.route("**/*", _abort_static_resources)
+
+
+# 导航超时 (毫秒)：慢页面尽快失败，交给重试处理
+NAVIGATION_TIMEOUT = 20000
+
+
+async def setup_scrape_page(page: Page):
+    """初始化采集用的页面：设置导航超时并拦截静态资源，需在 goto 之前调用"""
+    page.set_default_navigation_timeout(NAVIGATION_TIMEOUT)
+    await block_static_resources(page)
+
+
+async def _slot_page(session: BrowserSession, pages: List[Optional[Page]], slot: int) -> Page:
+    """返回 pages[slot] 上可用的页面，尚未创建或已关闭 (崩溃) 时新建一个"""
+    page = pages[slot]
+    if page is None or page.is_closed():
+        page = pages[slot] = await session.new_page()
+        await setup_scrape_page(page)
+    return page
+
+
+async def _discard_slot_page(pages: List[Optional[Page]], slot: int):
+    """页面操作出现 Playwright 错误后丢弃该槽位的页面，下一次使用 (包括重试) 时重新创建"""
+    page, pages[slot] = pages[slot], None
+    if page is not None and not page.is_closed():
+        try:
+            await page.close()
+        except PlaywrightError:
+            pass
+
+
 async def parse_detail_page(page: Page) -> Dict[str, Any]:
     """解析详情页的标本数据"""
-    detail_data = {}
-    
     # 等待页面关键元素加载完成
     try:
-        # 等待主要内容区域加载
-        await page.wait_for_selector("#formattedName", state="attached", timeout=30000)
-        # 额外等待一小段时间确保所有动态内容都加载完成
-        await page.wait_for_timeout(2000)
+        # 等待学名填充为非空文本即开始读取，不再固定等待 2 秒
+        await page.wait_for_function(_DETAIL_READY_JS, timeout=15000)
     except Exception as e:
         logging.warning(f"等待页面元素超时: {e}")
     
-    async def get_text(selector: str):
-        try:
-            element = await page.query_selector(selector)
-            if element:
-                text = await element.inner_text()
-                return text.strip() if text else ""
-            return ""
-        except Exception as e:
-            logging.debug(f"获取元素 {selector} 文本失败: {e}")
-            return ""
-
-    # 获取主图 URL
-    try:
-        img_element = await page.query_selector("#spm_image")
-        detail_data["detail_image_url"] = await img_element.get_attribute("src") if img_element else ""
-    except Exception as e:
-        logging.debug(f"获取图片URL失败: {e}")
-        detail_data["detail_image_url"] = ""
-
-    # 获取所有文本字段
-    detail_data["sci_name"] = await get_text("#formattedName")
-    detail_data["chinese_name"] = await get_text("#chineseName")
-    detail_data["identified_by"] = await get_text("#identifiedBy")
-    detail_data["date_identified"] = await get_text("#dateIdentified")
-    detail_data["recorded_by"] = await get_text("#recordedBy")
-    detail_data["record_number"] = await get_text("#recordNumber")
-    detail_data["verbatim_event_date"] = await get_text("#verbatimEventDate")
-    detail_data["locality"] = await get_text("#locality")
-    detail_data["elevation"] = await get_text("#elevation")
-    detail_data["habitat"] = await get_text("#habitat")
-    detail_data["occurrence_remarks"] = await get_text("#occurrenceRemarks")
-    detail_data["reproductive_condition"] = await get_text("#reproductiveCondition")
+    # 一次 evaluate 在页面内读取全部字段，避免逐个字段的 CDP 往返
+    detail_data = await page.evaluate(_DETAIL_EXTRACT_JS)
     
     return detail_data
 
 
+_LIST_EXTRACT_JS = """
+rows => rows.map(tr => {
+  const cells = tr.querySelectorAll('td');
+  const detailId = tr.getAttribute('data-collection-id');
+  if (cells.length < 6 || !detailId) return null;
+  return {
+    detail_id: detailId,
+    image_url: cells[0].querySelector('img')?.getAttribute('src') || '',
+    barcode: cells[1].innerText,
+    name: cells[2].innerText,
+    collector: cells[3].innerText,
+    location: cells[4].innerText,
+    year: cells[5].innerText,
+  };
+}).filter(Boolean)
+"""
+
+
 async def parse_list_page(page: Page) -> List[Dict[str, Any]]:
-    """解析列表页面的所有标本数据"""
+    """解析列表页面的所有标本数据 (一次 eval_on_selector_all 读取全部行，避免逐个单元格的 CDP 往返)"""
+    return await page.eval_on_selector_all("tbody#spms_list tr.spms-row", _LIST_EXTRACT_JS)
+
+
+class _ListPageParser(HTMLParser):
+    """从服务端渲染的列表页 HTML 中提取 tbody#spms_list 下的 tr.spms-row 行"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows: List[Dict[str, Any]] = []
+        self._in_list = False
+        self._row: Optional[Dict[str, Any]] = None
+        self._cell: Optional[List[str]] = None
+
+    def _close_cell(self):
+        if self._cell is not None and self._row is not None:
+            # 与 innerText 一致：合并连续空白并去除首尾空白
+            self._row["cells"].append(" ".join("".join(self._cell).split()))
+        self._cell = None
+
+    def _close_row(self):
+        self._close_cell()
+        if self._row is not None:
+            self.rows.append(self._row)
+        self._row = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tbody":
+            self._in_list = dict(attrs).get("id") == "spms_list"
+        elif not self._in_list:
+            return
+        elif tag == "tr":
+            self._close_row()
+            attr_map = dict(attrs)
+            if "spms-row" in (attr_map.get("class") or "").split():
+                self._row = {"detail_id": attr_map.get("data-collection-id"), "image_url": "", "cells": []}
+        elif self._row is None:
+            return
+        elif tag == "td":
+            self._close_cell()
+            self._cell = []
+        elif tag == "img" and self._cell is not None and not self._row["cells"] and not self._row["image_url"]:
+            # 只取第一个单元格中的图片
+            self._row["image_url"] = dict(attrs).get("src") or ""
+
+    def handle_endtag(self, tag):
+        if not self._in_list:
+            return
+        if tag == "td":
+            self._close_cell()
+        elif tag == "tr":
+            self._close_row()
+        elif tag == "tbody":
+            self._close_row()
+            self._in_list = False
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def parse_list_html(html: str) -> List[Dict[str, Any]]:
+    """解析列表页 HTML，返回与 parse_list_page 相同结构的数据"""
+    parser = _ListPageParser()
+    parser.feed(html)
+    parser.close()
+
     results = []
-    rows = await page.query_selector_all("tbody#spms_list tr.spms-row")
-    for row in rows:
-        cells = await row.query_selector_all("td")
-        if len(cells) < 6:
+    for row in parser.rows:
+        cells = row["cells"]
+        if len(cells) < 6 or not row["detail_id"]:
             continue
-        
-        # 从第一个单元格 (cells[0]) 获取图片
-        img_element = await cells[0].query_selector("img")
-        img_src = await img_element.get_attribute("src") if img_element else ""
+        results.append({
+            "detail_id": row["detail_id"],
+            "image_url": row["image_url"],
+            "barcode": cells[1],
+            "name": cells[2],
+            "collector": cells[3],
+            "location": cells[4],
+            "year": cells[5],
+        })
+    return results
 
-        # 获取行元素的 data-collection-id 属性
-        detail_id = await row.get_attribute("data-collection-id")
 
-        if not detail_id:
-            continue
+# 不会有结束标签的 HTML 元素
+_VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+})
+# 遇到同名开始标签时隐式结束上一个的元素 (如省略了 </td> 的单元格)
+_IMPLICIT_END_TAGS = frozenset({"td", "th", "tr", "li", "p", "dt", "dd", "option"})
+_DETAIL_ELEMENT_FIELDS = {element_id: field for field, element_id in _DETAIL_TEXT_FIELDS.items()}
 
-        # 按索引从每个单元格获取文本
-        data = {
-            "detail_id": detail_id,
-            "image_url": img_src,
-            "barcode": await cells[1].inner_text(),
-            "name": await cells[2].inner_text(),
-            "collector": await cells[3].inner_text(),
-            "location": await cells[4].inner_text(),
-            "year": await cells[5].inner_text(),
-        }
-        results.append(data)
-    return results
+
+class _DetailPageParser(HTMLParser):
+    """从详情页 HTML 中按元素 id 提取字段文本和 spm_image 的 src"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.fields: Dict[str, List[str]] = {}
+        self.image_url = ""
+        # 打开的元素栈，元素为 (标签名, 对应字段名或 None)
+        self._stack: List[tuple] = []
+        self._active: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        attr_map = dict(attrs)
+        element_id = attr_map.get("id")
+        if element_id == "spm_image":
+            self.image_url = attr_map.get("src") or ""
+        if tag == "br":
+            self.handle_data("\n")
+        if tag in _VOID_TAGS:
+            return
+        if tag in _IMPLICIT_END_TAGS and self._stack and self._stack[-1][0] == tag:
+            self.handle_endtag(tag)
+        field = _DETAIL_ELEMENT_FIELDS.get(element_id)
+        if field is not None and field not in self.fields:
+            self.fields[field] = []
+            self._active.append(field)
+        else:
+            field = None
+        self._stack.append((tag, field))
+
+    def handle_endtag(self, tag):
+        # 补全省略的结束标签：一直弹出到匹配的元素
+        if not any(open_tag == tag for open_tag, _ in self._stack):
+            return
+        while self._stack:
+            open_tag, field = self._stack.pop()
+            if field is not None:
+                self._active.remove(field)
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        for field in self._active:
+            self.fields[field].append(data)
 
 
+def parse_detail_html(html: str) -> Dict[str, Any]:
+    """解析详情页 HTML，返回与 parse_detail_page 相同结构的数据"""
+    parser = _DetailPageParser()
+    parser.feed(html)
+    parser.close()
+
+    detail_data: Dict[str, Any] = {"detail_image_url": parser.image_url}
+    for field in _DETAIL_TEXT_FIELDS:
+        # 近似 innerText：按行合并空白，去掉空行
+        lines = (" ".join(line.split()) for line in "".join(parser.fields.get(field, ())).splitlines())
+        detail_data[field] = "\n".join(line for line in lines if line)
+    return detail_data
+
+
+LIST_RECORDS_PER_PAGE = 30
+# 每个列表页工作者在同一会话中同时获取的列表页数量
+LIST_FETCH_CONCURRENCY = 4
+# 所有列表页工作者合计同时获取的列表页上限，避免触发站点限流或验证码
+MAX_CONCURRENT_LIST_FETCHES = 6
+_list_fetch_semaphore = asyncio.Semaphore(MAX_CONCURRENT_LIST_FETCHES)
+_list_url = "https://www.cvh.ac.cn/spms/list.php?&offset={}".format
+
+# 列表页是服务端渲染的，优先直接请求 HTML；一旦发现需要 JS 渲染才有数据，则关闭该路径
+_list_http_enabled = True
+
+
+async def fetch_list_records(context: BrowserContext, url: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    通过会话的 APIRequestContext (共享 Cookies) 直接获取列表页 HTML 并解析。
+    请求失败 (超时、非 2xx 等临时错误) 时返回 None；请求成功但未解析到数据时返回空列表。
+    两种情况调用方都回退到浏览器渲染，只有后者说明列表依赖 JS 渲染。
+    """
+    try:
+        response = await context.request.get(url, timeout=30000)
+        if not response.ok:
+            logging.warning(f"LIST_SCRAPER: HTTP {response.status} for {url}, falling back to browser.")
+            return None
+        html = await response.text()
+    except Exception as e:
+        logging.warning(f"LIST_SCRAPER: HTTP fetch failed for {url}: {e}, falling back to browser.")
+        return None
+    return parse_list_html(html)
+
+
+# 与列表页相同，详情页优先直接请求 HTML；发现字段需要 JS 渲染后关闭该路径
+_detail_http_enabled = True
+
+
+async def fetch_detail_record(context: BrowserContext, url: str) -> Optional[Dict[str, Any]]:
+    """
+    通过会话的 APIRequestContext 直接获取详情页 HTML 并解析。
+    请求失败 (超时、非 2xx 等临时错误) 时返回 None；请求成功时返回解析结果，HTML 中可能没有学名。
+    返回 None 或没有学名时调用方回退到浏览器渲染，只有后者说明字段依赖 JS 渲染。
+    """
+    try:
+        response = await context.request.get(url, timeout=30000)
+        if not response.ok:
+            logging.debug("DETAIL_SCRAPER: HTTP %s for %s, falling back to browser.", response.status, url)
+            return None
+        html = await response.text()
+    except Exception as e:
+        logging.debug("DETAIL_SCRAPER: HTTP fetch failed for %s: %s, falling back to browser.", url, e)
+        return None
+    return parse_detail_html(html)
+
+
+async def _load_list_records(
+    session: BrowserSession,
+    pages: List[Optional[Page]],
+    slot: int,
+    url: str,
+    session_name: str,
+) -> List[Dict[str, Any]]:
+    """获取一个列表页的数据：优先直接请求 HTML，失败时在 pages[slot] 上渲染 (按需创建页面)"""
+    global _list_http_enabled
+
+    async with _list_fetch_semaphore:
+        # 仅当 HTTP 请求成功但 HTML 中没有数据时为 True，临时的请求失败不能作为关闭 HTTP 路径的依据
+        http_returned_empty = False
+        if _list_http_enabled:
+            list_records = await fetch_list_records(session.context, url)
+            if list_records:
+                return list_records
+            http_returned_empty = list_records is not None
+
+        # 图片的 src 属性在 HTML 中即可读取，拦截资源请求不影响解析
+        page = await _slot_page(session, pages, slot)
+        try:
+            await page.goto(url, wait_until="domcontentloaded")
+            await page.wait_for_selector("tbody#spms_list tr.spms-row", state="attached", timeout=30000)
+            list_records = await parse_list_page(page)
+        except PlaywrightError:
+            await _discard_slot_page(pages, slot)
+            raise
+
+        if list_records and http_returned_empty and _list_http_enabled:
+            # 浏览器渲染后有数据而 HTML 中没有，说明列表依赖 JS，后续直接使用浏览器
+            _list_http_enabled = False
+            logging.warning(f"LIST_SCRAPER ({session_name}): List page requires rendering, HTTP fetch disabled.")
+        return list_records
+
+
+async def _enqueue_new_detail_ids(
+    db_manager: DatabaseManager,
+    detail_task_queue: asyncio.Queue,
+    detail_ids: List[str],
+    check_existing: bool = True,
+) -> int:
+    """
+    将 detail_ids 作为一个任务入队，返回入队数量。
+    check_existing 为 True 时先跳过详情表中已存在的 detail_id (重启或重试时)。
+    """
+    if detail_ids and check_existing:
+        existing = await db_manager.filter_existing_detail_ids(detail_ids)
+        if existing:
+            detail_ids = [did for did in detail_ids if did not in existing]
+    if detail_ids:
+        await detail_task_queue.put(detail_ids)
+    return len(detail_ids)
+
 
 @retry_on_failure(max_retries=2, delay=3, backoff=1.5)
 async def scrape_list_pages(
-    browser_manager: PlaywrightBrowser,
-    session_config: SessionConfig,
+    session: BrowserSession,
     session_name: str,
     db_manager: DatabaseManager,
     detail_task_queue: asyncio.Queue,
     max_pages: int,
     offset: int,
+    seen_detail_ids: Optional[Set[str]] = None,
+    db_conn=None,
 ):
-    """采集列表页，将基础数据存入数据库，并将 detail_id 放入详情页任务队列。"""
-    logging.info(f"LIST_SCRAPER ({session_name}): Starting chunk, offset={offset}, pages={max_pages}")
-    
-    session_manager = browser_manager.create_session(session_name, session_config)
-    async with session_manager as session:
-        page = await session.new_page()
-        try:
-            base_url = "https://www.cvh.ac.cn/spms/list.php"
-            records_per_page = 30
+    """
+    在列表页工作者持有的会话中采集列表页，将基础数据存入数据库，并将 detail_id 放入详情页任务队列。
+    每次并发获取 LIST_FETCH_CONCURRENCY 个列表页，再按 offset 顺序处理结果。
+    传入 seen_detail_ids 时，在多个列表工作者之间共享，已入队过的 detail_id 不会重复入队；
+    该集合应预先载入详情表中已有的 ID (见 DatabaseManager.load_seen_detail_ids)，此时不再逐页查询数据库。
+    未传入时，每页入队前查询详情表跳过已采集的 ID。
+    db_conn 为工作者持有的数据库连接，列表数据通过它写入。
+    """
+    logging.debug("LIST_SCRAPER (%s): Starting chunk, offset=%s, pages=%s", session_name, offset, max_pages)
+
+    offsets = range(offset, offset + max_pages * LIST_RECORDS_PER_PAGE, LIST_RECORDS_PER_PAGE)
+    # 每个并发位置一个页面，仅在需要回退到浏览器渲染时才创建
+    pages: List[Optional[Page]] = [None] * min(LIST_FETCH_CONCURRENCY, len(offsets))
+    try:
+        for start in range(0, len(offsets), LIST_FETCH_CONCURRENCY):
+            chunk = offsets[start:start + LIST_FETCH_CONCURRENCY]
+            results = await asyncio.gather(
+                *(_load_list_records(session, pages, slot, _list_url(current_offset), session_name)
+                  for slot, current_offset in enumerate(chunk)),
+                return_exceptions=True,
+            )
 
-            for page_num in range(max_pages):
-                current_offset = offset + (page_num * records_per_page)
-                url = f"{base_url}?&offset={current_offset}"
-                
-                await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-                await page.wait_for_selector("tbody#spms_list tr.spms-row", state="attached", timeout=30000)
+            reached_end = False
+            for current_offset, list_records in zip(chunk, results):
+                # 按顺序处理，之前的页面仍会入库，与逐页采集时出错的行为一致
+                if isinstance(list_records, BaseException):
+                    raise list_records
 
-                list_records = await parse_list_page(page)
                 if not list_records:
                     logging.warning(f"LIST_SCRAPER ({session_name}): No data found at offset {current_offset}.")
+                    reached_end = True
                     break
 
-                # 批量保存列表数据，提高性能
-                if list_records:
-                    await db_manager.save_list_data_batch(list_records)
+                detail_ids = [record["detail_id"] for record in list_records]
+                if seen_detail_ids is not None:
+                    # 过滤重叠 offset 或重试产生的重复 detail_id，每个重复项都省去一次详情页加载；
+                    # 在写入前先占用这些 ID，避免其他列表工作者在本页写入期间重复入队
+                    detail_ids = [did for did in detail_ids if did not in seen_detail_ids]
+                    seen_detail_ids.update(detail_ids)
 
-                # 将 detail_id 放入详情页任务队列
-                for record in list_records:
-                    await detail_task_queue.put(record["detail_id"])
-                
-                logging.info(f"LIST_SCRAPER ({session_name}): Saved and queued {len(list_records)} records from offset {current_offset}.")
+                try:
+                    # 整页数据一次批量写入，每页只有一次数据库往返；写入成功后才入队，
+                    # 保证入队的 detail_id 在列表表中都有对应记录 (因数据错误未写入的行不入队，
+                    # 否则其详情会在结束时被 purge_orphan_details 当作孤儿删除)
+                    skipped = await db_manager.save_list_data_batch(list_records, conn=db_conn)
+                    if skipped:
+                        dropped = [did for did in detail_ids if did in skipped]
+                        detail_ids = [did for did in detail_ids if did not in skipped]
+                        if seen_detail_ids is not None:
+                            seen_detail_ids.difference_update(dropped)
 
-        except Exception as e:
-            logging.error(f"LIST_SCRAPER ({session_name}): Error at offset {offset}: {e}", exc_info=True)
-        finally:
-            await page.close()
+                    # 整页中尚未采集的 detail_id 作为一个任务放入详情页队列，减少队列操作和任务切换
+                    queued = await _enqueue_new_detail_ids(
+                        db_manager, detail_task_queue, detail_ids, check_existing=seen_detail_ids is None
+                    )
+                except Exception:
+                    # 写入或入队失败时释放占用的 ID，之后的重试或其他工作者仍可将其入队
+                    if seen_detail_ids is not None:
+                        seen_detail_ids.difference_update(detail_ids)
+                    raise
+
+                logging.debug(
+                    "LIST_SCRAPER (%s): Saved %s records and queued %s from offset %s.",
+                    session_name, len(list_records), queued, current_offset,
+                )
+
+            if reached_end:
+                break
+
+    except Exception as e:
+        logging.error(f"LIST_SCRAPER ({session_name}): Error at offset {offset}: {e}", exc_info=True)
+    finally:
+        await asyncio.gather(*(page.close() for page in pages if page is not None))
 
 
 @retry_on_failure(max_retries=3, delay=5, backoff=2)
 async def scrape_detail_page(
-    browser_manager: PlaywrightBrowser,
-    session_config: SessionConfig,
+    session: BrowserSession,
+    pages: List[Optional[Page]],
+    slot: int,
     session_name: str,
-    db_manager: DatabaseManager,
     detail_id: str,
-):
-    """接收一个 detail_id，采集其详情页数据并存入数据库。"""
-    logging.debug(f"DETAIL_SCRAPER ({session_name}): Processing id: {detail_id}")
-    
-    session_manager = browser_manager.create_session(session_name, session_config, clear_state=True) # 使用无状态会话
-    async with session_manager as session:
-        page = await session.new_page()
-        try:
-            detail_url = f"https://www.cvh.ac.cn/spms/detail.php?id={detail_id}"
-            # 使用 networkidle 等待网络请求完成，确保页面完全加载
-            await page.goto(detail_url, wait_until="networkidle", timeout=60000)
-            
-            detail_info = await parse_detail_page(page)
+) -> Dict[str, Any]:
+    """
+    接收一个 detail_id，采集其详情页数据并返回，由调用方批量入库。
+    优先通过工作者会话的 APIRequestContext 直接请求 (复用会话的 Cookies 和连接)，
+    需要渲染时才在 pages[slot] 上打开页面 (按需创建，HTTP 可用时工作者不创建任何页面)。
+    失败时抛出异常，由重试装饰器在同一页面上重试，不影响工作者的其他页面。
+    """
+    global _detail_http_enabled
+
+    logging.debug("DETAIL_SCRAPER (%s): Processing id: %s", session_name, detail_id)
+
+    detail_url = f"https://www.cvh.ac.cn/spms/detail.php?id={detail_id}"
+
+    # 仅当 HTTP 请求成功但 HTML 中没有学名时为 True，临时的请求失败不能作为关闭 HTTP 路径的依据
+    http_returned_empty = False
+    if _detail_http_enabled:
+        detail_info = await fetch_detail_record(session.context, detail_url)
+        if detail_info is not None and detail_info["sci_name"]:
             detail_info["detail_id"] = detail_id
-            
-            await db_manager.save_detail_data(detail_info)
-            logging.info(f"DETAIL_SCRAPER ({session_name}): Successfully saved detail for id: {detail_id}")
-
-        except Exception as e:
-            logging.error(f"DETAIL_SCRAPER ({session_name}): Failed to process id {detail_id}: {e}")
-            # 在实际生产中，这里可以加入重试逻辑，例如将失败的 id 重新放入队列
-        finally:
-            await page.close()
+            return detail_info
+        http_returned_empty = detail_info is not None
+
+    page = await _slot_page(session, pages, slot)
+    try:
+        # 使用 networkidle 等待网络请求完成，确保页面完全加载
+        await page.goto(detail_url, wait_until="networkidle")
+        detail_info = await parse_detail_page(page)
+    except PlaywrightError:
+        await _discard_slot_page(pages, slot)
+        raise
+    if detail_info["sci_name"] and http_returned_empty and _detail_http_enabled:
+        # 浏览器渲染后才有数据，说明字段由 JS 填充，后续直接使用浏览器
+        _detail_http_enabled = False
+        logging.warning(f"DETAIL_SCRAPER ({session_name}): Detail page requires rendering, HTTP fetch disabled.")
+    detail_info["detail_id"] = detail_id
+    return detail_info
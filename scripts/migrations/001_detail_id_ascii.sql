@@ -0,0 +1,22 @@
+-- scripts/migrations/001_detail_id_ascii.sql
+-- 将已有库的 detail_id 从 utf8mb4 VARCHAR(255) 改为 ascii_bin VARCHAR(64)，并补充索引。
+-- 新建的库由 DatabaseManager._create_tables 直接创建为新结构，无需执行。
+-- 执行前请先确认现有 detail_id 均为 ASCII 且不超过 64 个字符：
+--   SELECT COUNT(*) FROM specimen_list WHERE detail_id REGEXP '[^ -~]' OR CHAR_LENGTH(detail_id) > 64;
+
+-- 外键两端的列类型必须一致，先删除外键，修改后再重建
+-- (外键名以 SHOW CREATE TABLE specimen_details 的结果为准)
+ALTER TABLE specimen_details DROP FOREIGN KEY specimen_details_ibfk_1;
+
+ALTER TABLE specimen_list
+    MODIFY detail_id VARCHAR(64) CHARACTER SET ascii COLLATE ascii_bin NOT NULL,
+    ADD KEY idx_barcode (barcode),
+    ADD KEY idx_created_at (created_at);
+
+ALTER TABLE specimen_details
+    MODIFY detail_id VARCHAR(64) CHARACTER SET ascii COLLATE ascii_bin NOT NULL,
+    ADD KEY idx_created_at (created_at);
+
+ALTER TABLE specimen_details
+    ADD CONSTRAINT specimen_details_ibfk_1
+    FOREIGN KEY (detail_id) REFERENCES specimen_list(detail_id) ON DELETE CASCADE;
@@ -0,0 +1,6 @@
+-- scripts/migrations/002_drop_detail_fk.sql
+-- 删除 specimen_details 上指向 specimen_list 的外键，提升并发批量写入详情的吞吐。
+-- 新建的库由 DatabaseManager._create_tables 直接创建为无外键结构，无需执行。
+-- 外键名以 SHOW CREATE TABLE specimen_details 的结果为准。
+-- 级联删除改由 DatabaseManager.purge_orphan_details 在每次正常结束时执行。
+ALTER TABLE specimen_details DROP FOREIGN KEY specimen_details_ibfk_1;
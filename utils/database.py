@@ -1,7 +1,31 @@
 # utils/database.py
+import asyncio
 import logging
+from operator import itemgetter
 import aiomysql
 
+# 列表数据和详情数据的列顺序，与批量 INSERT 的占位符顺序一致
+_LIST_COLUMNS = ("detail_id", "image_url", "barcode", "name", "collector", "location", "year")
+_DETAIL_COLUMNS = (
+    "detail_id", "detail_image_url", "sci_name", "chinese_name", "identified_by",
+    "date_identified", "recorded_by", "record_number", "verbatim_event_date",
+    "locality", "elevation", "habitat", "occurrence_remarks", "reproductive_condition",
+)
+_list_values = itemgetter(*_LIST_COLUMNS)
+_detail_values = itemgetter(*_DETAIL_COLUMNS)
+
+
+def _row_values(getter: itemgetter, columns: tuple, data: dict) -> tuple:
+    """按列顺序取出一行的值；采集结果通常字段齐全，走 itemgetter 快速路径，缺字段时补 None"""
+    try:
+        return getter(data)
+    except KeyError:
+        return tuple(data.get(column) for column in columns)
+
+
+# 多行 INSERT 每条语句最多包含的行数，避免超过 max_allowed_packet
+_INSERT_CHUNK_SIZE = 500
+
 
 class DatabaseManager:
     """异步管理 MySQL 数据库连接和操作"""
@@ -9,6 +33,14 @@ class DatabaseManager:
     def __init__(self, config: dict):
         self.config = config
         self.pool = None
+        # 详情数据写缓冲：累计到 detail_flush_size 条或每隔 detail_flush_interval 秒批量写入一次
+        self.detail_flush_size = config.get("detail_flush_size", 200)
+        self.detail_flush_interval = config.get("detail_flush_interval", 2.0)
+        self._detail_buffer = []
+        self._flush_lock = asyncio.Lock()
+        self._flusher_task = None
+        # close() 设置该事件通知定时写入任务退出；不直接取消任务，以免中断正在进行的写入而丢失已取出的数据
+        self._flusher_stop = asyncio.Event()
 
     async def initialize(self):
         """初始化数据库：创建数据库、连接池和表"""
@@ -28,13 +60,15 @@ class DatabaseManager:
                 logging.info(f"Database '{db_name}' ensured to exist.")
             conn.close()
 
-            # 3. 创建连接池
+            # 3. 创建连接池 (可通过配置中的 minsize/maxsize 按并发消费者数调整大小)
             self.pool = await aiomysql.create_pool(
                 host=self.config["host"],
                 port=self.config["port"],
                 user=self.config["user"],
                 password=self.config["password"],
                 db=self.config["db"],
+                minsize=self.config.get("minsize", 1),
+                maxsize=self.config.get("maxsize", 10),
                 autocommit=True,
             )
             logging.info("Database connection pool created.")
@@ -42,6 +76,9 @@ class DatabaseManager:
             # 4. 创建表
             await self._create_tables()
 
+            # 5. 启动详情数据的定时批量写入
+            self._flusher_task = asyncio.create_task(self._flusher())
+
         except Exception as e:
             logging.error(f"Failed to initialize database: {e}")
             raise
@@ -52,25 +89,31 @@ class DatabaseManager:
             raise ConnectionError("Database pool is not initialized. Call initialize() first.")
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cursor:
+                # detail_id 为 ASCII 标识，使用 ascii_bin 的定长上限列，主键索引每项最多 64 字节
+                # (utf8mb4 的 VARCHAR(255) 最多 1020 字节)；已有库的迁移见 scripts/migrations/
                 # 创建列表数据表
                 await cursor.execute("""
                     CREATE TABLE IF NOT EXISTS specimen_list (
-                        detail_id VARCHAR(255) PRIMARY KEY,
+                        detail_id VARCHAR(64) CHARACTER SET ascii COLLATE ascii_bin PRIMARY KEY,
                         image_url TEXT,
                         barcode VARCHAR(255),
                         name VARCHAR(255),
                         collector VARCHAR(255),
                         location TEXT,
                         year VARCHAR(50),
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        KEY idx_barcode (barcode),
+                        KEY idx_created_at (created_at)
                     ) ENGINE=InnoDB;
                 """)
                 logging.info("Table 'specimen_list' ensured to exist.")
 
                 # 创建详情数据表
+                # 不设外键：外键会让每次插入详情都回查并锁定列表表的父行，拖慢并发批量写入；
+                # 详情 ID 均来自列表页，删除列表数据后的孤儿详情由 purge_orphan_details 清理
                 await cursor.execute("""
                     CREATE TABLE IF NOT EXISTS specimen_details (
-                        detail_id VARCHAR(255) PRIMARY KEY,
+                        detail_id VARCHAR(64) CHARACTER SET ascii COLLATE ascii_bin PRIMARY KEY,
                         detail_image_url TEXT,
                         sci_name TEXT,
                         chinese_name VARCHAR(255),
@@ -85,7 +128,7 @@ class DatabaseManager:
                         occurrence_remarks TEXT,
                         reproductive_condition VARCHAR(255),
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (detail_id) REFERENCES specimen_list(detail_id) ON DELETE CASCADE
+                        KEY idx_created_at (created_at)
                     ) ENGINE=InnoDB;
                 """)
                 logging.info("Table 'specimen_details' ensured to exist.")
@@ -205,35 +248,169 @@ class DatabaseManager:
                 logging.error(f"Transaction failed, rolled back: {e}")
                 raise e
 
-    async def save_list_data_batch(self, data_list: list):
-        """批量保存列表数据，提高性能"""
+    def connection(self):
+        """从连接池借出一个连接 (异步上下文管理器)，供工作者在整个生命周期内持有，避免每次写入都经过连接池"""
+        if not self.pool:
+            raise ConnectionError("Database pool is not initialized.")
+        return self.pool.acquire()
+
+    async def save_list_data_batch(self, data_list: list, conn=None) -> set:
+        """
+        批量保存列表数据，提高性能，已存在的 detail_id 保持原值；返回因数据错误未写入的 detail_id。
+        每 _INSERT_CHUNK_SIZE 行一条多行 INSERT 语句，一次往返。
+        传入 conn 时使用调用方持有的连接 (见 connection())，否则从连接池获取。
+        """
         if not self.pool or not data_list:
-            return
+            return set()
 
-        sql = """
-            INSERT IGNORE INTO specimen_list
-            (detail_id, image_url, barcode, name, collector, location, year)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        values = [_row_values(_list_values, _LIST_COLUMNS, data) for data in data_list]
+        return await self._insert_rows("specimen_list", _LIST_COLUMNS, values, conn)
+
+    async def save_detail_data_batch(self, data_list: list, conn=None) -> set:
+        """批量保存详情数据，已存在的 detail_id 保持原值，每 _INSERT_CHUNK_SIZE 行一次往返；conn 和返回值同 save_list_data_batch"""
+        if not self.pool or not data_list:
+            return set()
+
+        values = [_row_values(_detail_values, _DETAIL_COLUMNS, data) for data in data_list]
+        return await self._insert_rows("specimen_details", _DETAIL_COLUMNS, values, conn)
+
+    async def _insert_rows(self, table: str, columns: tuple, rows: list, conn=None) -> set:
+        """
+        以多行 INSERT ... ON DUPLICATE KEY UPDATE 写入，按 _INSERT_CHUNK_SIZE 行分块。
+        与 INSERT IGNORE 不同，只有主键重复会被跳过，数据过长等错误不会被静默截断；
+        某个分块因数据错误失败时改为逐行写入，只丢弃出错的行并记录日志，返回这些行的 detail_id。
+        连接错误照常抛出。
         """
+        # 调用方持有的连接已断开时改从连接池获取
+        if conn is None or conn.closed:
+            async with self.pool.acquire() as conn:
+                return await self._insert_rows(table, columns, rows, conn)
+
+        row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        prefix = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+        suffix = " ON DUPLICATE KEY UPDATE detail_id = detail_id"
+        skipped = set()
+
+        async with conn.cursor() as cursor:
+            for start in range(0, len(rows), _INSERT_CHUNK_SIZE):
+                chunk = rows[start:start + _INSERT_CHUNK_SIZE]
+                sql = prefix + ", ".join([row_placeholder] * len(chunk)) + suffix
+                try:
+                    await cursor.execute(sql, [value for row in chunk for value in row])
+                except aiomysql.OperationalError:
+                    raise
+                except aiomysql.Error as e:
+                    if len(chunk) == 1:
+                        logging.error(f"Skipped row {chunk[0][columns.index('detail_id')]} in {table}: {e}")
+                        skipped.add(chunk[0][columns.index("detail_id")])
+                        continue
+                    logging.warning(f"Batch insert of {len(chunk)} rows into {table} failed ({e}), retrying row by row.")
+                    skipped |= await self._insert_rows_one_by_one(
+                        cursor, table, prefix + row_placeholder + suffix, columns, chunk
+                    )
+        return skipped
+
+    @staticmethod
+    async def _insert_rows_one_by_one(cursor, table: str, sql: str, columns: tuple, rows: list) -> set:
+        """逐行写入一个失败的分块，跳过并记录出错的行，返回这些行的 detail_id"""
+        id_index = columns.index("detail_id")
+        skipped = set()
+        for row in rows:
+            try:
+                await cursor.execute(sql, row)
+            except aiomysql.OperationalError:
+                raise
+            except aiomysql.Error as e:
+                logging.error(f"Skipped row {row[id_index]} in {table}: {e}")
+                skipped.add(row[id_index])
+        logging.info(f"Row-by-row insert into {table}: saved {len(rows) - len(skipped)}/{len(rows)} rows.")
+        return skipped
+
+    async def filter_existing_detail_ids(self, detail_ids: list) -> set:
+        """返回 detail_ids 中已存在于详情表的 ID (按主键查询，只走索引)"""
+        if not self.pool or not detail_ids:
+            return set()
+
+        placeholders = ", ".join(["%s"] * len(detail_ids))
+        sql = f"SELECT detail_id FROM specimen_details WHERE detail_id IN ({placeholders})"
 
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cursor:
-                # 批量插入
-                values = [(
-                    data.get("detail_id"),
-                    data.get("image_url"),
-                    data.get("barcode"),
-                    data.get("name"),
-                    data.get("collector"),
-                    data.get("location"),
-                    data.get("year"),
-                ) for data in data_list]
+                await cursor.execute(sql, detail_ids)
+                rows = await cursor.fetchall()
+        return {row[0] for row in rows}
 
-                await cursor.executemany(sql, values)
+    async def enqueue_detail(self, data: dict):
+        """将一条详情数据放入写缓冲，缓冲满时立即批量写入"""
+        self._detail_buffer.append(data)
+        if len(self._detail_buffer) >= self.detail_flush_size:
+            await self.flush_details()
+
+    async def flush_details(self):
+        """将写缓冲中的详情数据一次批量写入数据库，写入失败时记录错误并丢弃该批"""
+        async with self._flush_lock:
+            if not self._detail_buffer:
+                return
+            rows, self._detail_buffer = self._detail_buffer, []
+            try:
+                await self.save_detail_data_batch(rows)
+                logging.debug("Flushed %s buffered details.", len(rows))
+            except Exception as e:
+                logging.error(f"Failed to save {len(rows)} buffered details: {e}")
+
+    async def _flusher(self):
+        """后台任务：定时写入写缓冲中不足一批的详情数据，_flusher_stop 被设置后退出"""
+        while not self._flusher_stop.is_set():
+            try:
+                await asyncio.wait_for(self._flusher_stop.wait(), timeout=self.detail_flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush_details()
+
+    async def purge_orphan_details(self) -> int:
+        """删除列表表中已不存在的详情数据 (替代原外键的 ON DELETE CASCADE)，返回删除的行数"""
+        if not self.pool:
+            raise ConnectionError("Database pool is not initialized.")
+
+        sql = """
+            DELETE d FROM specimen_details d
+            LEFT JOIN specimen_list l ON d.detail_id = l.detail_id
+            WHERE l.detail_id IS NULL
+        """
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                deleted = await cursor.execute(sql)
+        if deleted:
+            logging.info(f"Purged {deleted} orphan details.")
+        return deleted
+
+    async def load_seen_detail_ids(self) -> set:
+        """载入详情表中全部已采集的 detail_id，用于启动时初始化去重集合 (流式读取，避免一次性缓存整个结果集)"""
+        if not self.pool:
+            raise ConnectionError("Database pool is not initialized.")
+
+        seen = set()
+        async with self.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.SSCursor) as cursor:
+                await cursor.execute("SELECT detail_id FROM specimen_details")
+                while True:
+                    rows = await cursor.fetchmany(10000)
+                    if not rows:
+                        break
+                    seen.update(row[0] for row in rows)
+        logging.info(f"Loaded {len(seen)} seen detail ids.")
+        return seen
 
     async def close(self):
-        """关闭数据库连接池"""
+        """停止定时写入、写入剩余的详情数据并关闭数据库连接池"""
+        if self._flusher_task:
+            # 等待定时写入任务完成当前的写入后退出
+            self._flusher_stop.set()
+            await self._flusher_task
+            self._flusher_task = None
+        await self.flush_details()
+
         if self.pool:
             self.pool.close()
             await self.pool.wait_closed()
-            logging.info("Database connection pool closed.")
\ No newline at end of file
+            logging.info("Database connection pool closed.")
+